@@ -1,18 +1,19 @@
-import os
+import sys
+import time
+
+import schedule
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import WebDriverException
 from dotenv import load_dotenv
-import os
 
+from src.config import CHROMEDRIVER_PATH
 from src.db_manager import DatabaseManager
 from src.riyasewana_scraper import RiyasewanaScraper
 from src.utils import setup_logging
 
 logger = setup_logging()
 
-path=os.path.join("drivers","chromedriver-linux64","chromedriver")
-
 def setup_driver():
     options = webdriver.ChromeOptions()
 
@@ -26,33 +27,88 @@ def setup_driver():
     options.add_argument('--enable-unsafe-swiftshader')
     options.add_argument('--window-size=1920,1080')
     options.add_argument('--log-level=3')
+
+    # Listings only need the HTML: skip images/CSS/fonts and return from
+    # driver.get as soon as the DOM is ready instead of waiting for every
+    # subresource.
+    options.page_load_strategy = 'eager'
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
     
     # Point to your chromedriver.exe directly
-    service = Service(path)
+    service = Service(str(CHROMEDRIVER_PATH))
 
     return webdriver.Chrome(service=service, options=options)
 
-def run():
-    driver = None
-    db_manager = None
+# Long-lived fallback driver, shared across runs in service mode so each
+# scheduled job doesn't pay the multi-second Chrome spin-up again.
+_driver = None
+
+def get_driver():
+    global _driver
+    if _driver is not None:
+        try:
+            # Doubles as a session-health probe and keeps cookie state from
+            # accumulating across runs.
+            _driver.delete_all_cookies()
+        except WebDriverException:
+            logger.warning("Fallback driver session lost, recreating...")
+            quit_driver()
+    if _driver is None:
+        _driver = setup_driver()
+    return _driver
+
+def quit_driver():
+    global _driver
+    if _driver is not None:
+        try:
+            _driver.quit()
+        except WebDriverException:
+            pass
+        _driver = None
+        logger.info("WebDriver closed.")
+
+def run(keep_driver=False):
     try:
-        driver = setup_driver()
-        db_manager = DatabaseManager()
-        scraper = RiyasewanaScraper(driver=driver, db_manager=db_manager)
+        with DatabaseManager() as db_manager:
+            # Pages are fetched over plain HTTP; the Selenium driver is only
+            # created on demand for pages that need JS rendering.
+            scraper = RiyasewanaScraper(db_manager=db_manager,
+                                        driver_factory=get_driver)
 
-        logger.info("Starting Riyasewana scraping job...")
-        new_listings = scraper.scrape_site()
-        logger.info(f"Scraping job finished. {len(new_listings)} new listings collected.")
+            logger.info("Starting Riyasewana scraping job...")
+            # scrape_site yields DB-sized batches as the crawl produces
+            # them; persisting here keeps memory bounded by one batch.
+            inserted = 0
+            for batch in scraper.scrape_site():
+                inserted += db_manager.insert_listings_batch(batch)
+            logger.info("Scraping job finished. %d new listings inserted.", inserted)
     except Exception as e:
-        logger.critical(f"Fatal error: {e}", exc_info=True)
+        logger.critical("Fatal error: %s", e, exc_info=True)
+    finally:
+        if not keep_driver:
+            quit_driver()
+
+def serve(interval_hours=24):
+    """Long-running mode: run on a schedule, reusing the fallback driver
+    between jobs instead of re-launching Chrome for each one."""
+    logger.info("Starting scraper service, every %sh.", interval_hours)
+    schedule.every(interval_hours).hours.do(run, keep_driver=True)
+    run(keep_driver=True)
+    try:
+        while True:
+            schedule.run_pending()
+            time.sleep(60)
     finally:
-        if driver:
-            driver.quit()
-            logger.info("WebDriver closed.")
-        if db_manager:
-            db_manager.close()
-            logger.info("Database connection closed.")
+        quit_driver()
 
 if __name__ == "__main__":
     load_dotenv()
-    run()
+    if "--serve" in sys.argv:
+        serve()
+    else:
+        run()
@@ -1,4 +1,10 @@
 import os
+from pathlib import Path
+
+# Anchor on this file, not os.getcwd(): the entrypoint is run from
+# different working directories (repo root, /app/src in Docker).
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CHROMEDRIVER_PATH = PROJECT_ROOT / "drivers" / "chromedriver-linux64" / "chromedriver"
 
 RIYASWANA_BASE_URL = "https://riyasewana.com"
 
@@ -7,7 +13,17 @@ RIYASWANA_VEHICLE_MAKES = ['volvo']
 
 DELAY_RANGE_PAGE_LOAD_SEC = (2, 5)
 DELAY_RANGE_POST_LOAD_SEC = (2, 4)
-DB_BATCH_INSERT_SIZE = 50
+DB_BATCH_INSERT_SIZE = int(os.getenv("DB_BATCH_INSERT_SIZE", "10000"))
+
+# Async HTTP fetcher settings
+FETCH_CONCURRENCY = 64
+FETCH_PER_HOST_LIMIT = 16
+FETCH_TIMEOUT_SEC = 30
+FETCH_MAX_RETRIES = 3
+FETCH_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
 
 # DB settings from env
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -1,13 +1,51 @@
+import io
+import logging
+import operator
+import threading
+
 import psycopg2
+from psycopg2.extras import execute_values
+
 from .config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
-from .utils import setup_logging
+logger = logging.getLogger(__name__)
+
+LISTING_COLUMNS = (
+    'date', 'make', 'type', 'title', 'location', 'mileage',
+    'overview_price', 'detail_price', 'engine_cc', 'yom',
+    'post_make', 'model', 'gear', 'fuel_type', 'post_url', 'image_url'
+)
+_LISTING_DEFAULTS = dict.fromkeys(LISTING_COLUMNS, '')
+_row_getter = operator.itemgetter(*LISTING_COLUMNS)
+
+# Built once at import so every batch reuses the same statement text
+# instead of reassembling it per call.
+BULK_INSERT_SQL = (
+    f"INSERT INTO listings ({', '.join(LISTING_COLUMNS)}) VALUES %s"
+)
+INSERT_SQL = (
+    BULK_INSERT_SQL + " ON CONFLICT (post_url) DO NOTHING RETURNING id"
+)
+
+def _copy_escape(value):
+    # Escapes for PostgreSQL's COPY text format.
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+                 .replace('\n', '\\n').replace('\r', '\\r'))
 
-logger = setup_logging()
 
 class DatabaseManager:
+    # From roughly this many rows, COPY through a staging table beats the
+    # multi-row INSERT; below it the staging round-trips aren't worth it.
+    COPY_MIN_ROWS = 1000
+
     def __init__(self):
         self.conn = None
         self.cursor = None
+        self._read_conn = None
+        self._seen_urls = None
+        # The shared cursor is not safe to use from several threads at
+        # once; writers serialize on this lock, readers get their own
+        # connection.
+        self._write_lock = threading.Lock()
         self.connect()
         self.create_table()
 
@@ -21,7 +59,16 @@ class DatabaseManager:
                 password=DB_PASSWORD
             )
             self.cursor = self.conn.cursor()
-            logger.info(f"Connected to DB: {DB_NAME} at {DB_HOST}")
+            self._apply_session_settings()
+            logger.info("Connected to DB: %s at %s", DB_NAME, DB_HOST)
+
+    def _apply_session_settings(self):
+        # Asynchronous commit: don't wait for the WAL flush on every commit.
+        # A crash can lose the last few batches, but the scraper re-collects
+        # them on the next run, so durability of individual batches is cheap
+        # to give up for commit-heavy insert throughput.
+        self.cursor.execute("SET synchronous_commit TO OFF")
+        self.conn.commit()
 
     def create_table(self):
         try:
@@ -47,52 +94,194 @@ class DatabaseManager:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
             """)
+            # The UNIQUE constraint on post_url already maintains the
+            # covering index for lookups; clean up the duplicate one
+            # earlier versions created, which only added write-side
+            # maintenance per insert.
+            self.cursor.execute("DROP INDEX IF EXISTS idx_listings_posturl")
             self.conn.commit()
             logger.info("Listings table ensured.")
         except Exception as e:
-            logger.critical(f"Error creating listings table: {e}")
+            logger.critical("Error creating listings table: %s", e)
             raise
 
     def insert_listings_batch(self, listings_data):
         if not listings_data:
             return 0
-        data_tuples = [(
-            d.get('date', ''), d.get('make', ''), d.get('type', ''),
-            d.get('title', ''), d.get('location', ''), d.get('mileage', ''),
-            d.get('overview_price', ''), d.get('detail_price', ''),
-            d.get('engine_cc', ''), d.get('yom', ''), d.get('post_make', ''),
-            d.get('model', ''), d.get('gear', ''), d.get('fuel_type', ''),
-            d.get('post_url', ''), d.get('image_url', '')
-        ) for d in listings_data]
+        # Skip rows the cache already knows are in the table: ON CONFLICT
+        # would ignore them anyway, but only after a unique-index probe and
+        # a WAL entry per duplicate.
+        if self._seen_urls is not None:
+            listings_data = [d for d in listings_data
+                             if d.get('post_url') not in self._seen_urls]
+            if not listings_data:
+                return 0
+        # Insert in post_url order so unique-index probes walk the B-tree
+        # sequentially instead of touching random pages.
+        listings_data = sorted(listings_data,
+                               key=lambda d: d.get('post_url', ''))
+        # One itemgetter call per row instead of 16 dict.get calls; missing
+        # keys are default-filled by the dict merge.
+        data_tuples = [_row_getter({**_LISTING_DEFAULTS, **d})
+                       for d in listings_data]
 
         try:
-            self.cursor.executemany("""
-            INSERT INTO listings (
-                date, make, type, title, location, mileage,
-                overview_price, detail_price, engine_cc, yom,
-                post_make, model, gear, fuel_type, post_url, image_url
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (post_url) DO NOTHING
-            """, data_tuples)
-            self.conn.commit()
-            inserted = self.cursor.rowcount
-            logger.info(f"Inserted {inserted} new listings.")
+            # One explicit transaction per batch: a single commit (and fsync)
+            # for the whole batch instead of autocommitting row by row.
+            with self._write_lock, self.conn:
+                if len(data_tuples) >= self.COPY_MIN_ROWS:
+                    inserted = self._copy_insert(data_tuples)
+                else:
+                    # execute_values expands the batch into one multi-row
+                    # VALUES statement per page instead of a round-trip per
+                    # row. RETURNING id yields exactly the rows that
+                    # survived the conflict clause, which is more dependable
+                    # than rowcount and hands new IDs to any downstream
+                    # consumer for free.
+                    new_ids = execute_values(self.cursor, INSERT_SQL,
+                                             data_tuples, page_size=500,
+                                             fetch=True)
+                    inserted = len(new_ids)
+            if self._seen_urls is not None:
+                self._seen_urls.update(
+                    d['post_url'] for d in listings_data if d.get('post_url'))
+            logger.info("Inserted %d new listings.", inserted)
             return inserted
         except Exception as e:
-            logger.error(f"DB insert error: {e}")
-            self.conn.rollback()
+            logger.error("DB insert error: %s", e)
+            return 0
+
+    def _copy_insert(self, data_tuples):
+        """COPY the batch into a temp staging table, then merge it with
+        ON CONFLICT semantics. Must run inside the caller's transaction;
+        returns the number of genuinely new rows."""
+        buf = io.StringIO()
+        for row in data_tuples:
+            buf.write('\t'.join(_copy_escape(field) for field in row))
+            buf.write('\n')
+        buf.seek(0)
+        columns = ', '.join(LISTING_COLUMNS)
+        self.cursor.execute(
+            "CREATE TEMP TABLE listings_staging "
+            "(LIKE listings INCLUDING DEFAULTS) ON COMMIT DROP")
+        self.cursor.copy_expert(
+            f"COPY listings_staging ({columns}) FROM STDIN", buf)
+        self.cursor.execute(f"""
+        INSERT INTO listings ({columns})
+        SELECT {columns} FROM listings_staging
+        ON CONFLICT (post_url) DO NOTHING
+        RETURNING id
+        """)
+        return len(self.cursor.fetchall())
+
+    def bulk_load(self, listings_iter):
+        """One-off initial import into an empty (or fresh) table.
+
+        Drops the post_url indexes, loads every row without per-insert
+        uniqueness maintenance, then rebuilds the unique index in one
+        pass. Incremental runs should keep using insert_listings_batch,
+        which relies on the unique index for ON CONFLICT.
+        """
+        # Dedupe by post_url up front so the index rebuild cannot fail.
+        by_url = {}
+        for d in listings_iter:
+            post_url = d.get('post_url', '')
+            if post_url:
+                by_url[post_url] = d
+        if not by_url:
+            return 0
+        data_tuples = [_row_getter({**_LISTING_DEFAULTS, **d})
+                       for d in by_url.values()]
+        try:
+            with self._write_lock, self.conn:
+                self.cursor.execute(
+                    "ALTER TABLE listings DROP CONSTRAINT IF EXISTS listings_post_url_key")
+                # After a previous bulk_load the uniqueness lives in a plain
+                # index of the same name, not a constraint; drop that too or
+                # repeat loads run with the index still in place.
+                self.cursor.execute("DROP INDEX IF EXISTS listings_post_url_key")
+                self.cursor.execute("DROP INDEX IF EXISTS idx_listings_posturl")
+                execute_values(self.cursor, BULK_INSERT_SQL, data_tuples,
+                               page_size=500)
+                self.cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS listings_post_url_key
+                ON listings(post_url)
+                """)
+            if self._seen_urls is not None:
+                self._seen_urls.update(by_url)
+            logger.info("Bulk-loaded %d listings.", len(data_tuples))
+            return len(data_tuples)
+        except Exception as e:
+            logger.error("DB bulk load error: %s", e)
             return 0
 
     def get_all_post_urls(self):
+        # Cached after the first call; insert_listings_batch keeps the set
+        # current, so repeated calls skip the table scan entirely.
+        if self._seen_urls is not None:
+            return self._seen_urls
         try:
-            self.cursor.execute("SELECT post_url FROM listings")
-            urls = {row[0] for row in self.cursor.fetchall() if row[0]}
-            return urls
+            cursor = self._get_read_conn().cursor()
+            cursor.execute(
+                "SELECT post_url FROM listings WHERE post_url IS NOT NULL")
+            # Iterate the cursor directly instead of materializing an
+            # intermediate fetchall() list alongside the result set.
+            self._seen_urls = {url for (url,) in cursor}
+            cursor.close()
+            return self._seen_urls
         except Exception as e:
-            logger.error(f"Error fetching URLs: {e}")
+            logger.error("Error fetching URLs: %s", e)
             return set()
 
+    def filter_existing_urls(self, urls):
+        """Return the subset of urls already present in listings.
+
+        One index-backed ANY() lookup sized to the caller's page, so
+        checking a page of listings stays O(page) as the table grows.
+        """
+        urls = [url for url in urls if url]
+        if not urls:
+            return set()
+        # If the full cache was already paid for, answer from memory.
+        if self._seen_urls is not None:
+            return {url for url in urls if url in self._seen_urls}
+        try:
+            cursor = self._get_read_conn().cursor()
+            cursor.execute(
+                "SELECT post_url FROM listings WHERE post_url = ANY(%s)",
+                (urls,))
+            existing = {url for (url,) in cursor}
+            cursor.close()
+            return existing
+        except Exception as e:
+            logger.error("Error filtering URLs: %s", e)
+            return set()
+
+    def _get_read_conn(self):
+        # Lazily opened read-only connection so lookups from worker
+        # threads never contend with the writer's cursor or transaction.
+        if self._read_conn is None:
+            self._read_conn = psycopg2.connect(
+                host=DB_HOST,
+                port=DB_PORT,
+                dbname=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                options="-c default_transaction_read_only=on"
+            )
+            self._read_conn.autocommit = True
+        return self._read_conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def close(self):
+        if self._read_conn:
+            self._read_conn.close()
+            self._read_conn = None
         if self.conn:
             self.cursor.close()
             self.conn.close()
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .config import (
+    FETCH_CONCURRENCY, FETCH_MAX_RETRIES, FETCH_PER_HOST_LIMIT,
+    FETCH_TIMEOUT_SEC, FETCH_USER_AGENT
+)
+logger = logging.getLogger(__name__)
+
+
+async def fetch(session, url, semaphore, host_semaphore, delay_range=None):
+    """Fetch one URL and return its body text, or '' on any failure.
+
+    Transient failures (connection errors, HTTP 5xx) are retried with
+    exponential backoff; client errors are not. The politeness delay is
+    slept inside the per-host semaphore, so it throttles one host while
+    requests to other hosts keep flowing.
+    """
+    async with semaphore, host_semaphore:
+        for attempt in range(FETCH_MAX_RETRIES):
+            if delay_range:
+                await asyncio.sleep(random.uniform(*delay_range))
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return await response.text()
+                    if response.status < 500:
+                        logger.warning("GET %s returned HTTP %s", url, response.status)
+                        return ""
+                    logger.warning(
+                        "GET %s returned HTTP %s (attempt %d/%d)",
+                        url, response.status, attempt + 1, FETCH_MAX_RETRIES)
+            except Exception as e:
+                logger.warning("GET %s failed (attempt %d/%d): %s",
+                               url, attempt + 1, FETCH_MAX_RETRIES, e)
+            # Back off between attempts only; sleeping after the last one
+            # would just hold the semaphore slots for a doomed URL.
+            if attempt < FETCH_MAX_RETRIES - 1:
+                await asyncio.sleep(2 ** attempt)
+        return ""
+
+
+class AsyncFetcher:
+    """One shared ClientSession plus throttles for a whole scrape run.
+
+    Entering the context opens the session; every fetch through the same
+    instance reuses its connection pool instead of paying TLS and TCP
+    setup per batch.
+    """
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+        self._host_semaphores = defaultdict(
+            lambda: asyncio.Semaphore(FETCH_PER_HOST_LIMIT))
+        connector = aiohttp.TCPConnector(limit_per_host=FETCH_PER_HOST_LIMIT)
+        timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT_SEC)
+        headers = {"User-Agent": FETCH_USER_AGENT}
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._session.close()
+
+    async def fetch(self, url, delay_range=None):
+        return await fetch(self._session, url, self._semaphore,
+                           self._host_semaphores[urlparse(url).netloc],
+                           delay_range)
+
+    async def fetch_all(self, urls, delay_range=None):
+        urls = list(urls)
+        bodies = await asyncio.gather(
+            *(self.fetch(url, delay_range) for url in urls))
+        return dict(zip(urls, bodies))
+
+
+async def _fetch_all(urls, delay_range=None):
+    async with AsyncFetcher() as fetcher:
+        return await fetcher.fetch_all(urls, delay_range)
+
+
+def fetch_pages(urls, delay_range=None):
+    """Fetch all URLs concurrently and return a {url: html} dict.
+
+    URLs that could not be fetched map to an empty string so callers can
+    fall back to the Selenium driver for them.
+    """
+    urls = list(urls)
+    if not urls:
+        return {}
+    return asyncio.run(_fetch_all(urls, delay_range))
@@ -1,9 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import Dict, Iterator, List
 
 class ISiteScraper(ABC):
     @abstractmethod
-    def scrape_site(self) -> List[Dict]:
+    def scrape_site(self) -> Iterator[List[Dict]]:
         pass
 
     @abstractmethod
@@ -11,5 +11,5 @@ class ISiteScraper(ABC):
         pass
 
     @abstractmethod
-    def _extract_post_details(self, post_url: str) -> Dict:
+    def _extract_post_details(self, post_url: str, html: str = None) -> Dict:
         pass
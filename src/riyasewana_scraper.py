@@ -1,24 +1,139 @@
+import asyncio
+import gc
+import logging
+import queue
+import re
+import threading
 import time
 import random
-from typing import List, Dict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
 from selenium.webdriver.remote.webdriver import WebDriver
-from tqdm import tqdm
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
 
 from dateutil.parser import parse
 from .config import (
     RIYASWANA_BASE_URL, RIYASWANA_VEHICLE_TYPES, RIYASWANA_VEHICLE_MAKES,
     DELAY_RANGE_PAGE_LOAD_SEC, DELAY_RANGE_POST_LOAD_SEC, DB_BATCH_INSERT_SIZE
 )
-from .utils import safe_urljoin, setup_logging
+from .utils import safe_urljoin, tqdm
 from .interfaces import ISiteScraper
+from .fetcher import AsyncFetcher, fetch_pages
+
+logger = logging.getLogger(__name__)
+
+# Only this subtree is ever queried on listing pages, so skip building
+# the rest of the document (headers, sidebars, footers) during the parse.
+LISTING_STRAINER = SoupStrainer('div', id='content')
+
+# Detail pages are read with lxml directly; no id collection needed for
+# a single xpath over the spec table.
+_DETAIL_PARSER = etree.HTMLParser(collect_ids=False)
+_DETAIL_CELLS_XPATH = etree.XPath('//td[contains(@class, "aleft")]')
+
+# The site only uses a handful of date formats; try those before paying
+# for dateutil's format guessing.
+_DATE_FORMATS = ("%Y-%m-%d", "%d %b %Y")
+
+# Tokens that mark a boxintxt cell as a price rather than a location.
+_MONEY_TOKENS = ('rs', 'negotiable')
+_REL_DATE_RE = re.compile(r'(\d+)\s+(day|hour|minute)s?\s+ago', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def _parse_absolute_date(date_str: str) -> datetime:
+    """Parse an absolute listing date; many listings share the same
+    string, so results are memoized for the life of the process."""
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            pass
+    # Unknown shape: log once per string so new site formats get noticed,
+    # then let dateutil have a go.
+    logger.info("Date '%s' not matched by fast formats, trying dateutil.", date_str)
+    return parse(date_str)
+
+
+def _parse_date_str(date_str: str) -> datetime:
+    """Parse a listing date string into a datetime.
+
+    Relative dates ("2 hours ago") are anchored to now() on every call
+    and must stay outside the cache: a memoized absolute value would go
+    stale within a run and across scheduled runs in serve mode, making
+    the freshness cutoff reject listings that are actually new. Only
+    absolute formats are cached.
+    """
+    match = _REL_DATE_RE.search(date_str)
+    if match:
+        unit = match.group(2).lower() + 's'
+        return datetime.now() - timedelta(**{unit: int(match.group(1))})
+    return _parse_absolute_date(date_str)
+
+
+def _cell_text(cell) -> str:
+    return ''.join(t.strip() for t in cell.itertext())
+
+
+def parse_post_details(html: str) -> Dict:
+    """Parse the spec table of a detail page into its field dict.
+
+    Module-level (and driver-free) so it can be pickled into a process
+    pool when many pages are parsed at once. Goes through lxml directly
+    rather than a BeautifulSoup tree: one compiled xpath pulls the
+    label/value td pairs without building the soup wrapper objects.
+    """
+    if not html:
+        return {}
+    tree = etree.fromstring(html, _DETAIL_PARSER)
+    # lxml yields no root for whitespace/comment-only bodies.
+    if tree is None:
+        return {}
+    details = {}
+    all_cells = _DETAIL_CELLS_XPATH(tree)
+    for i in range(0, len(all_cells) - 1, 2):
+        label = _cell_text(all_cells[i]).lower()
+        details[label] = _cell_text(all_cells[i + 1])
+    # Only plain strings are kept from here on; drop the tree now instead
+    # of holding it until the frame exits.
+    del all_cells
+    tree.clear()
+
+    return {
+        'engine_cc': details.get("engine (cc)", ""),
+        'yom': details.get("yom", ""),
+        'post_make': details.get("make", ""),
+        'model': details.get("model", ""),
+        'price_detail': details.get("price", ""),
+        'gear': details.get("gear", ""),
+        'fuel_type': details.get("fuel type", ""),
+    }
 
-logger = setup_logging()
 
 class RiyasewanaScraper(ISiteScraper):
-    def __init__(self, driver: WebDriver, db_manager):
+    # Collect cyclic garbage every N Selenium-rendered pages to keep the
+    # fallback path's RSS flat on long crawls.
+    GC_EVERY_N_FALLBACK_PAGES = 25
+
+    # Below this many pages the pickle/IPC cost of the process pool beats
+    # the parse time it saves; parse inline instead.
+    PARSE_POOL_MIN_PAGES = 16
+
+    # CSS selectors used per listing, hoisted so the loop body doesn't
+    # reassemble them.
+    _LISTING_UL_SEL = 'div#content > ul'
+    _H2A_SEL = 'h2.more a'
+    _IMG_SEL = 'div.imgbox a img'
+    _BOX_SEL = 'div.boxintxt'
+    _BOX_S_SEL = 'div.boxintxt.s'
+
+    def __init__(self, db_manager, driver: WebDriver = None, driver_factory=None):
         self.driver = driver
+        self.driver_factory = driver_factory
         self.db_manager = db_manager
         self.base_url = RIYASWANA_BASE_URL
         self.vehicle_types = RIYASWANA_VEHICLE_TYPES
@@ -26,155 +141,347 @@ class RiyasewanaScraper(ISiteScraper):
         self.delay_page = DELAY_RANGE_PAGE_LOAD_SEC
         self.delay_post = DELAY_RANGE_POST_LOAD_SEC
         self.batch_size = DB_BATCH_INSERT_SIZE
-        self.seen_urls = set(db_manager.get_all_post_urls())
-        logger.info(f"Loaded {len(self.seen_urls)} URLs from DB.")
+        # Per-run cache of URLs confirmed to exist in the DB; filled page
+        # by page via filter_existing_urls instead of eager-loading the
+        # whole table at startup.
+        self.seen_urls = set()
+        # URLs queued in the current run but not yet committed; kept apart
+        # from seen_urls, which strictly means "already in the table".
+        self._queued_urls = set()
+        self._fallback_fetches = 0
+        # One Chrome session serves every combo task, and fallback fetches
+        # arrive from asyncio.to_thread workers; all driver access (creation,
+        # navigation, cookie clearing) serializes on this lock so concurrent
+        # tasks can't race _get_driver or interleave page loads.
+        self._driver_lock = threading.Lock()
+        # Run-wide AsyncFetcher and parse pool, only set while
+        # _scrape_site_async is live.
+        self._fetcher = None
+        self._parse_pool = None
+
+    def _get_driver(self):
+        """Lazily create the Selenium fallback driver on first use."""
+        if self.driver is None and self.driver_factory is not None:
+            logger.info("Creating Selenium fallback driver...")
+            self.driver = self.driver_factory()
+        return self.driver
+
+    def close_driver(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+            logger.info("WebDriver closed.")
+
+    def _fetch_with_driver(self, url: str) -> str:
+        with self._driver_lock:
+            driver = self._get_driver()
+            if driver is None:
+                return ""
+            try:
+                driver.get(url)
+            except InvalidSessionIdException:
+                logger.warning("Driver session lost, recreating...")
+                self.close_driver()
+                driver = self._get_driver()
+                if driver is None:
+                    return ""
+                driver.get(url)
+            time.sleep(random.uniform(*self.delay_post))
+            self._fallback_fetches += 1
+            if self._fallback_fetches % self.GC_EVERY_N_FALLBACK_PAGES == 0:
+                gc.collect()
+            return driver.page_source
+
+    def _clear_driver_cookies(self):
+        """Clear fallback-driver cookies between combos; holds the driver
+        lock so it can't interrupt a fetch that is mid-flight."""
+        with self._driver_lock:
+            if self.driver is not None:
+                try:
+                    self.driver.delete_all_cookies()
+                except WebDriverException:
+                    pass
+
+    def _fetch_many(self, urls: List[str], delay_range=None) -> Dict[str, str]:
+        """Fetch URLs concurrently over HTTP, falling back to Selenium for
+        any that come back empty (e.g. pages that require JS)."""
+        htmls = fetch_pages(urls, delay_range)
+        for url, html in htmls.items():
+            if not html:
+                logger.info("Empty body for %s, retrying with Selenium.", url)
+                htmls[url] = self._fetch_with_driver(url)
+        return htmls
+
+    async def _fetch_many_async(self, urls: List[str], delay_range=None) -> Dict[str, str]:
+        """Like _fetch_many, but on the run-wide session held by
+        _scrape_site_async. Selenium fallbacks run in a worker thread so
+        they don't stall the event loop."""
+        htmls = await self._fetcher.fetch_all(urls, delay_range)
+        for url, html in htmls.items():
+            if not html:
+                logger.info("Empty body for %s, retrying with Selenium.", url)
+                htmls[url] = await asyncio.to_thread(self._fetch_with_driver, url)
+        return htmls
 
     def _parse_listing_date(self, date_str: str) -> datetime:
         try:
             # Attempt to parse the date string
-            return parse(date_str)
+            return _parse_date_str(date_str)
         except Exception as e:
-            logger.warning(f"Failed to parse date '{date_str}': {e}")
+            logger.warning("Failed to parse date '%s': %s", date_str, e)
             return None
 
-    def scrape_site(self) -> List[Dict]:
-        all_new_listings = []
+    def scrape_site(self) -> Iterator[List[Dict]]:
+        """Run the crawl, yielding new listings in DB-sized batches.
+
+        The async crawl runs on a worker thread and hands finished
+        batches over a bounded queue, so the process holds O(batch_size)
+        listings at a time instead of every listing from the run.
+        """
+        batches = queue.Queue(maxsize=2)
+        failure = []
+
+        def _run():
+            try:
+                asyncio.run(self._scrape_site_async(batches))
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                batches.put(None)
+
+        worker = threading.Thread(target=_run, daemon=True,
+                                  name="riyasewana-crawl")
+        worker.start()
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            yield batch
+        worker.join()
+        if failure:
+            raise failure[0]
+
+    async def _scrape_site_async(self, out_queue):
+        # One parse pool for the whole run, spun up alongside the session
+        # so combos share its workers instead of forking a pool per page.
+        with ProcessPoolExecutor() as pool:
+            async with AsyncFetcher() as fetcher:
+                self._fetcher = fetcher
+                self._parse_pool = pool
+                try:
+                    await self._scrape_all(out_queue)
+                finally:
+                    self._fetcher = None
+                    self._parse_pool = None
+
+    async def _scrape_all(self, out_queue):
         current_batch = []
 
-        total_iterations = len(self.vehicle_types) * len(self.vehicle_makes)
-        with tqdm(total=total_iterations, desc="Riyasewana Types x Makes") as pbar_outer:
-            for make in self.vehicle_makes:
-                for vehicle_type in self.vehicle_types:
-                    logger.info(f"Scraping Type='{vehicle_type}', Make='{make}'")
-                    page = 1
-                    while True:
-                        url = f"{self.base_url}/search/{vehicle_type}/{make}"
-                        if page > 1:
-                            url += f"?page={page}"
-                        logger.info(f"Loading page {page}: {url}")
-
-                        try:
-                            self.driver.get(url)
-                            time.sleep(random.uniform(*self.delay_page))
-                            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-
-                            content_div = soup.find('div', id='content')
-                            ul_tag = content_div.find('ul') if content_div else None
-                            if not ul_tag:
-                                logger.info("No listings container found, stopping pagination.")
-                                break
-
-                            li_tags = ul_tag.find_all('li', class_="item round")
-                            if not li_tags:
-                                logger.info("No listings found on page, stopping pagination.")
-                                break
-
-                            new_on_page = 0
-
-                            for li in li_tags:
-                                overview = self._extract_listing_details(li)
-                                post_url = overview.get('post_url', '')
-                                if not post_url or post_url in self.seen_urls:
-                                    continue
-
-                                # Parse and filter by date (last 7 days)
-                                listing_date_str = overview.get('date', '')
-                                listing_date = self._parse_listing_date(listing_date_str)
-
-                                if listing_date is None:
-                                    logger.info(f"Skipping listing with unparseable date: {listing_date_str}")
-                                    continue
-
-                                if listing_date < datetime.now() - timedelta(days=1):
-                                    logger.info(f"Skipping old listing dated {listing_date_str}")
-                                    continue
-
-                                self.seen_urls.add(post_url)
-
-                                details = self._extract_post_details(post_url)
-
-                                combined = {**overview, **details,
-                                            'make': make, 'type': vehicle_type}
-
-                                all_new_listings.append(combined)
-                                current_batch.append(combined)
-                                new_on_page += 1
-
-                                if len(current_batch) >= self.batch_size:
-                                    self.db_manager.insert_listings_batch(current_batch)
-                                    current_batch.clear()
-
-                            if new_on_page == 0:
-                                logger.info("No new listings on this page, ending pagination.")
-                                break
-
-                            page += 1
-                        except Exception as e:
-                            logger.error(f"Error scraping page {page}: {e}", exc_info=True)
-                            break
+        # (make, type) combos hit disjoint URL spaces, so they run as
+        # concurrent tasks on the shared session; the fetcher's global and
+        # per-host semaphores cap total in-flight requests.
+        pairs = [(make, vehicle_type)
+                 for make in self.vehicle_makes
+                 for vehicle_type in self.vehicle_types]
+        with tqdm(total=len(pairs), desc="Riyasewana Types x Makes") as pbar_outer:
+            async def scrape_pair(make, vehicle_type):
+                try:
+                    return await self._scrape_combo(make, vehicle_type,
+                                                    out_queue, current_batch)
+                finally:
+                    # Keep the fallback driver's session lean across combos.
+                    if self.driver is not None:
+                        await asyncio.to_thread(self._clear_driver_cookies)
                     pbar_outer.update(1)
 
-        if current_batch:
-            self.db_manager.insert_listings_batch(current_batch)
+            counts = await asyncio.gather(*(scrape_pair(make, vehicle_type)
+                                            for make, vehicle_type in pairs))
+
+        await self._flush_batch(out_queue, current_batch)
+        logger.info("Scraping completed, total new listings: %d", sum(counts))
+
+    async def _flush_batch(self, out_queue, current_batch):
+        """Hand the accumulated batch to the consuming thread.
+
+        queue.put can block on the bounded queue, so it runs in a worker
+        thread rather than on the event loop.
+        """
+        if not current_batch:
+            return
+        batch = list(current_batch)
+        current_batch.clear()
+        await asyncio.to_thread(out_queue.put, batch)
+
+    async def _scrape_combo(self, make, vehicle_type,
+                            out_queue, current_batch):
+        """Paginate one make/type search, appending new listings to the
+        shared batch (safe: tasks interleave only at awaits); returns how
+        many listings this combo contributed."""
+        logger.info("Scraping Type='%s', Make='%s'", vehicle_type, make)
+        base = f"{self.base_url}/search/{vehicle_type}/{make}"
+        combo_count = 0
+        page = 1
+        while True:
+            url = base if page == 1 else f"{base}?page={page}"
+            logger.info("Loading page %d: %s", page, url)
+
+            try:
+                html = (await self._fetch_many_async(
+                    [url], delay_range=self.delay_page))[url]
+                if not html:
+                    logger.info("Could not fetch listing page, stopping pagination.")
+                    break
+                soup = BeautifulSoup(html, 'lxml',
+                                     parse_only=LISTING_STRAINER)
+
+                ul_tag = soup.select_one(self._LISTING_UL_SEL)
+                if not ul_tag:
+                    logger.info("No listings container found, stopping pagination.")
+                    break
+
+                li_tags = ul_tag.find_all('li', class_="item round")
+                if not li_tags:
+                    logger.info("No listings found on page, stopping pagination.")
+                    break
+
+                overviews = [self._extract_listing_details(li)
+                             for li in li_tags]
+                # Everything needed from the page is now in overviews;
+                # release the soup before the detail fetches below keep
+                # this frame (and the tree) alive for a while.
+                soup.decompose()
+                del soup, ul_tag, li_tags
+
+                # One batched existence check for the whole page; the
+                # psycopg2 round-trip blocks, so it runs off the loop.
+                self.seen_urls.update(await asyncio.to_thread(
+                    self.db_manager.filter_existing_urls,
+                    [o.get('post_url', '') for o in overviews]))
+
+                candidates = []
 
-        logger.info(f"Scraping completed, total new listings: {len(all_new_listings)}")
-        return all_new_listings
+                for overview in overviews:
+                    post_url = overview.get('post_url', '')
+                    if (not post_url or post_url in self.seen_urls
+                            or post_url in self._queued_urls):
+                        continue
+
+                    # Parse and filter by date (last 7 days)
+                    listing_date_str = overview.get('date', '')
+                    listing_date = self._parse_listing_date(listing_date_str)
+
+                    if listing_date is None:
+                        logger.info("Skipping listing with unparseable date: %s", listing_date_str)
+                        continue
+
+                    if listing_date < datetime.now() - timedelta(days=1):
+                        logger.info("Skipping old listing dated %s", listing_date_str)
+                        continue
+
+                    self._queued_urls.add(post_url)
+                    candidates.append(overview)
+
+                # Fetch all new detail pages for this page concurrently.
+                detail_htmls = await self._fetch_many_async(
+                    [c['post_url'] for c in candidates],
+                    delay_range=self.delay_post)
+                details_by_url = await self._parse_details_batch(detail_htmls)
+
+                new_on_page = 0
+                for overview in candidates:
+                    post_url = overview['post_url']
+                    details = details_by_url.get(post_url, {})
+
+                    combined = {**overview, **details,
+                                'make': make, 'type': vehicle_type}
+
+                    current_batch.append(combined)
+                    new_on_page += 1
+                    combo_count += 1
+
+                    if len(current_batch) >= self.batch_size:
+                        await self._flush_batch(out_queue, current_batch)
+
+                if new_on_page == 0:
+                    logger.info("No new listings on this page, ending pagination.")
+                    break
+
+                page += 1
+            except Exception as e:
+                logger.error("Error scraping page %d: %s", page, e, exc_info=True)
+                break
+        return combo_count
 
     def _extract_listing_details(self, li_tag) -> Dict:
         data = {}
         try:
-            a_tag = li_tag.select_one('h2.more a')
-            data['title'] = a_tag.text.strip() if a_tag else ""
+            a_tag = li_tag.select_one(self._H2A_SEL)
+            data['title'] = a_tag.get_text(strip=True) if a_tag else ""
             post_url_raw = a_tag['href'] if a_tag and 'href' in a_tag.attrs else ""
             data['post_url'] = post_url_raw if post_url_raw.startswith("http") else safe_urljoin(self.base_url, post_url_raw)
 
-            img_tag = li_tag.select_one('div.imgbox a img')
+            img_tag = li_tag.select_one(self._IMG_SEL)
             img_src = img_tag['src'].strip() if img_tag and 'src' in img_tag.attrs else ""
             data['image_url'] = img_src if img_src.startswith("http") else "https:" + img_src if img_src else ""
 
-            date_div = li_tag.find('div', class_='boxintxt s')
-            data['date'] = date_div.text.strip() if date_div else ""
+            date_div = li_tag.select_one(self._BOX_S_SEL)
+            data['date'] = date_div.get_text(strip=True) if date_div else ""
 
             data['location'] = ""
             data['overview_price'] = ""
             data['mileage'] = ""
 
-            boxintxts = li_tag.find_all('div', class_='boxintxt')
-            for box in boxintxts:
-                txt = box.text.strip()
-                if "km" in txt.lower():
+            seen_values = {data['date']}
+            for box in li_tag.select(self._BOX_SEL):
+                txt = box.get_text(strip=True)
+                txt_lower = txt.lower()
+                if "km" in txt_lower:
                     data['mileage'] = txt
-                elif "rs" in txt.lower() or "negotiable" in txt.lower():
+                    seen_values.add(txt)
+                elif any(token in txt_lower for token in _MONEY_TOKENS):
                     data['overview_price'] = txt
-                elif txt not in [data['overview_price'], data['mileage'], data['date']]:
+                    seen_values.add(txt)
+                elif txt and txt not in seen_values:
                     data['location'] = txt
         except Exception as e:
-            logger.warning(f"Error extracting listing overview: {e}")
+            logger.warning("Error extracting listing overview: %s", e)
         return data
 
-    def _extract_post_details(self, post_url: str) -> Dict:
-        details = {}
+    def _extract_post_details(self, post_url: str, html: str = None) -> Dict:
         try:
-            self.driver.get(post_url)
-            time.sleep(random.uniform(*self.delay_post))
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-
-            all_cells = soup.select('td.aleft, td.aleft.ftin, td.aleft.tfiv')
-            for i in range(0, len(all_cells), 2):
-                label = all_cells[i].get_text(strip=True).lower()
-                if i + 1 < len(all_cells):
-                    value = all_cells[i + 1].get_text(strip=True)
-                    details[label] = value
-
-            return {
-                'engine_cc': details.get("engine (cc)", ""),
-                'yom': details.get("yom", ""),
-                'post_make': details.get("make", ""),
-                'model': details.get("model", ""),
-                'price_detail': details.get("price", ""),
-                'gear': details.get("gear", ""),
-                'fuel_type': details.get("fuel type", ""),
-            }
+            if html is None:
+                html = self._fetch_many([post_url])[post_url]
+            if not html:
+                logger.warning("No HTML for post %s, skipping details.", post_url)
+                return {}
+            return parse_post_details(html)
         except Exception as e:
-            logger.error(f"Error extracting post details from {post_url}: {e}", exc_info=True)
-            return details
+            logger.error("Error extracting post details from %s: %s", post_url, e, exc_info=True)
+            return {}
+
+    async def _parse_details_batch(self, htmls_by_url: Dict[str, str]) -> Dict[str, Dict]:
+        """Parse many detail pages, farming large batches out to the
+        run-wide process pool via the event loop so other combos and
+        in-flight fetches keep making progress while the pool works."""
+        urls = list(htmls_by_url)
+        if self._parse_pool is not None and len(urls) >= self.PARSE_POOL_MIN_PAGES:
+            loop = asyncio.get_running_loop()
+            parsed = await asyncio.gather(
+                *(loop.run_in_executor(self._parse_pool, parse_post_details,
+                                       htmls_by_url[url]) for url in urls),
+                return_exceptions=True)
+            # A bad page degrades to {} like the inline path instead of
+            # killing the combo's pagination.
+            details_by_url = {}
+            for url, result in zip(urls, parsed):
+                if isinstance(result, BaseException):
+                    logger.error("Error parsing details for %s: %s",
+                                 url, result)
+                    result = {}
+                details_by_url[url] = result
+            return details_by_url
+        return {url: self._extract_post_details(url, html)
+                for url, html in htmls_by_url.items()}
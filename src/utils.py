@@ -1,8 +1,14 @@
+import contextlib
 import logging
 import os
+from functools import lru_cache
 from urllib.parse import urljoin
 
 def setup_logging(level_str=None):
+    # Configure handlers once, from the entry point; re-imports and tests
+    # calling this again skip the basicConfig lock/handler walk entirely.
+    if logging.getLogger().handlers:
+        return logging.getLogger("vehicle_scraper")
     level_str = level_str or os.environ.get('LOG_LEVEL', 'INFO').upper()
     log_level = getattr(logging, level_str, logging.INFO)
     logging.basicConfig(
@@ -11,16 +17,20 @@ def setup_logging(level_str=None):
     )
     return logging.getLogger("vehicle_scraper")
 
+@lru_cache(maxsize=4096)
 def safe_urljoin(base, url):
+    # Joins repeat heavily (same base, recurring relative paths), so
+    # memoize to skip urljoin's parse work on the hot paths.
     return urljoin(base, url)
 
 if os.environ.get('ENABLE_TQDM', 'false').lower() == 'true':
     from tqdm import tqdm as _tqdm
 else:
-    class _tqdm:
-        def __init__(self, *args, **kwargs): pass
-        def __enter__(self): return self
-        def __exit__(self, *args): pass
-        def update(self, *args): pass
+    class _tqdm(contextlib.nullcontext):
+        def __init__(self, *args, **kwargs):
+            super().__init__(self)
+
+        def update(self, *args):
+            pass
 
 tqdm = _tqdm